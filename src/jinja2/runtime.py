@@ -1,5 +1,4 @@
 """The runtime functions and state used by compiled templates."""
-import functools
 import sys
 import typing as t
 from collections import abc
@@ -24,7 +23,6 @@ from .utils import object_type_repr
 from .utils import pass_eval_context
 
 V = t.TypeVar("V")
-F = t.TypeVar("F", bound=t.Callable[..., t.Any])
 
 if t.TYPE_CHECKING:
     import logging
@@ -75,13 +73,21 @@ def identity(x: V) -> V:
 
 def markup_join(seq: t.Iterable[t.Any]) -> str:
     """Concatenation that escapes if necessary and converts to string."""
-    buf = []
-    iterator = map(soft_str, seq)
+    buf = ""
+    iterator = iter(seq)
+
     for arg in iterator:
-        buf.append(arg)
-        if hasattr(arg, "__html__"):
-            return Markup("").join(chain(buf, iterator))
-    return concat(buf)
+        # An exact str, the common case, needs no conversion and can
+        # never carry __html__.
+        if arg.__class__ is not str:
+            arg = soft_str(arg)
+
+            if hasattr(arg, "__html__"):
+                return Markup("").join(chain((buf, arg), map(soft_str, iterator)))
+
+        buf += arg
+
+    return buf
 
 
 def str_join(seq: t.Iterable[t.Any]) -> str:
@@ -135,21 +141,21 @@ class TemplateReference:
 
     def __init__(self, context: "Context") -> None:
         self.__context = context
+        self.__references: t.Dict[str, "BlockReference"] = {}
 
     def __getitem__(self, name: str) -> t.Any:
-        blocks = self.__context.blocks[name]
-        return BlockReference(name, self.__context, blocks, 0)
-
-    def __repr__(self) -> str:
-        return f"<{type(self).__name__} {self.__context.name!r}>"
+        rv = self.__references.get(name)
 
+        if rv is None:
+            blocks = self.__context.blocks[name]
+            rv = self.__references[name] = BlockReference(
+                name, self.__context, blocks, 0
+            )
 
-def _dict_method_all(dict_method: F) -> F:
-    @functools.wraps(dict_method)
-    def f_all(self: "Context") -> t.Any:
-        return dict_method(self.get_all())
+        return rv
 
-    return t.cast(F, f_all)
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.__context.name!r}>"
 
 
 @abc.Mapping.register
@@ -206,7 +212,7 @@ class Context:
         self.vars: t.Dict[str, t.Any] = {}
         self.environment: "Environment" = environment
         self.eval_ctx = EvalContext(self.environment, name)
-        self.exported_vars: t.Set[str] = set()
+        self._exported_vars: t.Optional[t.Set[str]] = None
         self.name = name
         self.globals_keys = set() if globals is None else set(globals)
 
@@ -219,15 +225,22 @@ class Context:
         self, name: str, current: t.Callable[["Context"], t.Iterator[str]]
     ) -> t.Union["BlockReference", "Undefined"]:
         """Render a parent block."""
-        try:
-            blocks = self.blocks[name]
-            index = blocks.index(current) + 1
-            blocks[index]
-        except LookupError:
-            return self.environment.undefined(
-                f"there is no parent block called {name!r}.", name="super"
-            )
-        return BlockReference(name, self, blocks, index)
+        blocks = self.blocks.get(name)
+
+        if blocks is not None:
+            # The current block function is the same object that was
+            # registered on the stack, so compare by identity rather
+            # than going through equality dispatch.
+            for index, block in enumerate(blocks):
+                if block is current:
+                    if index + 1 < len(blocks):
+                        return BlockReference(name, self, blocks, index + 1)
+
+                    break
+
+        return self.environment.undefined(
+            f"there is no parent block called {name!r}.", name="super"
+        )
 
     def get(self, key: str, default: t.Any = None) -> t.Any:
         """Look up a variable by name, or return a default if the key is
@@ -285,17 +298,29 @@ class Context:
 
             return rv
 
-        if key in self.vars:
-            return self.vars[key]
+        rv = self.vars.get(key, missing)
 
-        if key in self.parent:
-            return self.parent[key]
+        if rv is not missing:
+            return rv
+
+        return self.parent.get(key, missing)
+
+    @property
+    def exported_vars(self) -> t.Set[str]:
+        """The set of names the template exports. Most templates never
+        export anything, so the set is only created on first access.
+        """
+        if self._exported_vars is None:
+            self._exported_vars = set()
 
-        return missing
+        return self._exported_vars
 
     def get_exported(self) -> t.Dict[str, t.Any]:
         """Get a new dict with the exported variables."""
-        return {k: self.vars[k] for k in self.exported_vars}
+        if not self._exported_vars:
+            return {}
+
+        return {k: self.vars[k] for k in self._exported_vars}
 
     def get_all(self) -> t.Dict[str, t.Any]:
         """Return the complete context as dict including the exported
@@ -320,15 +345,18 @@ class Context:
         if __debug__:
             __traceback_hide__ = True  # noqa
 
-        # Allow callable classes to take a context
-        if (
-            hasattr(__obj, "__call__")  # noqa: B004
-            and _PassArg.from_obj(__obj.__call__) is not None  # type: ignore
-        ):
-            __obj = __obj.__call__  # type: ignore
-
         pass_arg = _PassArg.from_obj(__obj)
 
+        # Allow callable classes to take a context. Only probe __call__
+        # if the object itself is not marked; plain functions and bound
+        # methods resolve above without the extra attribute lookups.
+        if pass_arg is None and hasattr(__obj, "__call__"):  # noqa: B004
+            __call = __obj.__call__  # type: ignore
+            pass_arg = _PassArg.from_obj(__call)
+
+            if pass_arg is not None:
+                __obj = __call
+
         if pass_arg is _PassArg.context:
             # the active context should have access to variables set in
             # loops and blocks without mutating the context itself
@@ -365,9 +393,46 @@ class Context:
         context.blocks.update((k, list(v)) for k, v in self.blocks.items())
         return context
 
-    keys = _dict_method_all(dict.keys)
-    values = _dict_method_all(dict.values)
-    items = _dict_method_all(dict.items)
+    def keys(self) -> t.List[str]:
+        """Return the variable names visible in the context. Unlike
+        :meth:`get_all` this never merges the scopes into a new dict.
+        """
+        vars = self.vars
+
+        if not vars:
+            return list(self.parent)
+
+        parent = self.parent
+
+        if not parent:
+            return list(vars)
+
+        return [*parent, *(k for k in vars if k not in parent)]
+
+    def items(self) -> t.List[t.Tuple[str, t.Any]]:
+        """Return the visible variables and their values. Unlike
+        :meth:`get_all` this never merges the scopes into a new dict.
+        """
+        vars = self.vars
+
+        if not vars:
+            return list(self.parent.items())
+
+        parent = self.parent
+
+        if not parent:
+            return list(vars.items())
+
+        return [
+            *((k, vars.get(k, v)) for k, v in parent.items()),
+            *((k, v) for k, v in vars.items() if k not in parent),
+        ]
+
+    def values(self) -> t.List[t.Any]:
+        """Return the values of the visible variables. Unlike
+        :meth:`get_all` this never merges the scopes into a new dict.
+        """
+        return [v for _, v in self.items()]
 
     def __contains__(self, name: str) -> bool:
         return name in self.vars or name in self.parent
@@ -390,6 +455,8 @@ class Context:
 class BlockReference:
     """One block on a template reference."""
 
+    __slots__ = ("name", "_context", "_stack", "_depth")
+
     def __init__(
         self,
         name: str,
@@ -440,14 +507,21 @@ class LoopContext:
     about the loop and iteration.
     """
 
-    #: Current iteration of the loop, starting at 0.
-    index0 = -1
-
-    _length: t.Optional[int] = None
-    _after: t.Any = missing
-    _current: t.Any = missing
-    _before: t.Any = missing
-    _last_changed_value: t.Any = missing
+    __slots__ = (
+        "_iterable",
+        "_iterator",
+        "_undefined",
+        "_recurse",
+        "depth0",
+        "index0",
+        "index",
+        "first",
+        "_length",
+        "_after",
+        "_current",
+        "_before",
+        "_last_changed_value",
+    )
 
     def __init__(
         self,
@@ -470,6 +544,17 @@ class LoopContext:
         self._recurse = recurse
         #: How many levels deep a recursive loop currently is, starting at 0.
         self.depth0 = depth0
+        #: Current iteration of the loop, starting at 0.
+        self.index0 = -1
+        #: Current iteration of the loop, starting at 1.
+        self.index = 0
+        #: Whether this is the first iteration of the loop.
+        self.first = False
+        self._length: t.Optional[int] = None
+        self._after: t.Any = missing
+        self._current: t.Any = missing
+        self._before: t.Any = missing
+        self._last_changed_value: t.Any = missing
 
     @staticmethod
     def _to_iterator(iterable: t.Iterable[V]) -> t.Iterator[V]:
@@ -502,11 +587,6 @@ class LoopContext:
         """How many levels deep a recursive loop currently is, starting at 1."""
         return self.depth0 + 1
 
-    @property
-    def index(self) -> int:
-        """Current iteration of the loop, starting at 1."""
-        return self.index0 + 1
-
     @property
     def revindex0(self) -> int:
         """Number of iterations from the end of the loop, ending at 0.
@@ -523,11 +603,6 @@ class LoopContext:
         """
         return self.length - self.index0
 
-    @property
-    def first(self) -> bool:
-        """Whether this is the first iteration of the loop."""
-        return self.index0 == 0
-
     def _peek_next(self) -> t.Any:
         """Return the next element in the iterable, or :data:`missing`
         if the iterable is exhausted. Only peeks one item ahead, caching
@@ -582,10 +657,12 @@ class LoopContext:
 
         :param args: One or more values to cycle through.
         """
-        if not args:
+        n = len(args)
+
+        if not n:
             raise TypeError("no items for cycling given")
 
-        return args[self.index0 % len(args)]
+        return args[self.index0 % n]
 
     def changed(self, *value: t.Any) -> bool:
         """Return ``True`` if previously called with a different value
@@ -609,7 +686,10 @@ class LoopContext:
         else:
             rv = next(self._iterator)
 
-        self.index0 += 1
+        i = self.index0 + 1
+        self.index0 = i
+        self.index = i + 1
+        self.first = i == 0
         self._before = self._current
         self._current = rv
         return rv, self
@@ -633,6 +713,8 @@ class LoopContext:
 
 
 class AsyncLoopContext(LoopContext):
+    __slots__ = ()
+
     _iterator: t.AsyncIterator[t.Any]  # type: ignore
 
     @staticmethod
@@ -697,7 +779,10 @@ class AsyncLoopContext(LoopContext):
         else:
             rv = await self._iterator.__anext__()
 
-        self.index0 += 1
+        i = self.index0 + 1
+        self.index0 = i
+        self.index = i + 1
+        self.first = i == 0
         self._before = self._current
         self._current = rv
         return rv, self
@@ -706,6 +791,19 @@ class AsyncLoopContext(LoopContext):
 class Macro:
     """Wraps a macro function."""
 
+    __slots__ = (
+        "_environment",
+        "_func",
+        "_argument_count",
+        "name",
+        "arguments",
+        "catch_kwargs",
+        "catch_varargs",
+        "caller",
+        "explicit_caller",
+        "_default_autoescape",
+    )
+
     def __init__(
         self,
         environment: "Environment",
@@ -773,10 +871,7 @@ class Macro:
         # and defaults.
         if off != self._argument_count:
             for name in self.arguments[len(arguments) :]:
-                try:
-                    value = kwargs.pop(name)
-                except KeyError:
-                    value = missing
+                value = kwargs.pop(name, missing)
                 if name == "caller":
                     found_caller = True
                 arguments.append(value)
@@ -837,6 +932,16 @@ class Macro:
         return f"<{type(self).__name__} {name}>"
 
 
+def _strip_slots(cls: t.Type[V]) -> t.Type[V]:
+    """Remove the ``__slots__`` attribute once the class is created.
+    The slot descriptors remain in effect; the attribute itself is
+    unneeded afterwards and contains wrong data for subclasses.
+    """
+    del cls.__slots__
+    return cls
+
+
+@_strip_slots
 class Undefined:
     """The default undefined type.  This undefined type can be printed and
     iterated over, but every other access will raise an :exc:`UndefinedError`:
@@ -857,6 +962,7 @@ class Undefined:
         "_undefined_obj",
         "_undefined_name",
         "_undefined_exception",
+        "_undefined_message_cache",
     )
 
     def __init__(
@@ -870,28 +976,36 @@ class Undefined:
         self._undefined_obj = obj
         self._undefined_name = name
         self._undefined_exception = exc
+        self._undefined_message_cache: t.Optional[str] = None
 
     @property
     def _undefined_message(self) -> str:
         """Build a message about the undefined value based on how it was
-        accessed.
+        accessed. The message is built at most once per instance; the
+        many dunders that route through
+        :meth:`_fail_with_undefined_error` reuse it.
         """
-        if self._undefined_hint:
-            return self._undefined_hint
-
-        if self._undefined_obj is missing:
-            return f"{self._undefined_name!r} is undefined"
+        rv = self._undefined_message_cache
+
+        if rv is None:
+            if self._undefined_hint:
+                rv = self._undefined_hint
+            elif self._undefined_obj is missing:
+                rv = f"{self._undefined_name!r} is undefined"
+            elif not isinstance(self._undefined_name, str):
+                rv = (
+                    f"{object_type_repr(self._undefined_obj)} has no"
+                    f" element {self._undefined_name!r}"
+                )
+            else:
+                rv = (
+                    f"{object_type_repr(self._undefined_obj)!r} has no"
+                    f" attribute {self._undefined_name!r}"
+                )
 
-        if not isinstance(self._undefined_name, str):
-            return (
-                f"{object_type_repr(self._undefined_obj)} has no"
-                f" element {self._undefined_name!r}"
-            )
+            self._undefined_message_cache = rv
 
-        return (
-            f"{object_type_repr(self._undefined_obj)!r} has no"
-            f" attribute {self._undefined_name!r}"
-        )
+        return rv
 
     @internalcode
     def _fail_with_undefined_error(
@@ -1009,6 +1123,7 @@ def make_logging_undefined(
     return LoggingUndefined
 
 
+@_strip_slots
 class ChainableUndefined(Undefined):
     """An undefined that is chainable, where both ``__getattr__`` and
     ``__getitem__`` return itself rather than raising an
@@ -1036,6 +1151,7 @@ class ChainableUndefined(Undefined):
     __getitem__ = __getattr__  # type: ignore
 
 
+@_strip_slots
 class DebugUndefined(Undefined):
     """An undefined that returns the debug info when printed.
 
@@ -1068,6 +1184,7 @@ class DebugUndefined(Undefined):
         return f"{{{{ {message} }}}}"
 
 
+@_strip_slots
 class StrictUndefined(Undefined):
     """An undefined that barks on print and iteration as well as boolean
     tests and all kinds of comparisons.  In other words: you can do nothing
@@ -1092,13 +1209,3 @@ class StrictUndefined(Undefined):
     __iter__ = __str__ = __len__ = Undefined._fail_with_undefined_error
     __eq__ = __ne__ = __bool__ = __hash__ = Undefined._fail_with_undefined_error
     __contains__ = Undefined._fail_with_undefined_error
-
-
-# Remove slots attributes, after the metaclass is applied they are
-# unneeded and contain wrong data for subclasses.
-del (
-    Undefined.__slots__,
-    ChainableUndefined.__slots__,
-    DebugUndefined.__slots__,
-    StrictUndefined.__slots__,
-)
@@ -81,25 +81,34 @@ class _PassArg(enum.Enum):
 
     @classmethod
     def from_obj(cls, obj: F) -> t.Optional["_PassArg"]:
-        if hasattr(obj, "jinja_pass_arg"):
-            return obj.jinja_pass_arg  # type: ignore
-
-        for prefix in "context", "eval_context", "environment":
-            squashed = prefix.replace("_", "")
-
-            for name in f"{squashed}function", f"{squashed}filter":
-                if getattr(obj, name, False) is True:
-                    warnings.warn(
-                        f"{name!r} is deprecated and will stop working"
-                        f" in Jinja 3.1. Use 'pass_{prefix}' instead.",
-                        DeprecationWarning,
-                        stacklevel=2,
-                    )
-                    return cls[prefix]
+        rv = getattr(obj, "jinja_pass_arg", None)
+
+        if rv is not None:
+            return rv  # type: ignore
+
+        for name, prefix in _legacy_pass_arg_names:
+            if getattr(obj, name, False) is True:
+                warnings.warn(
+                    f"{name!r} is deprecated and will stop working"
+                    f" in Jinja 3.1. Use 'pass_{prefix}' instead.",
+                    DeprecationWarning,
+                    stacklevel=2,
+                )
+                return cls[prefix]
 
         return None
 
 
+#: Deprecated marker attributes still recognized by
+#: :meth:`_PassArg.from_obj`, built once so the miss path does not
+#: reconstruct the names on every call.
+_legacy_pass_arg_names = tuple(
+    (prefix.replace("_", "") + suffix, prefix)
+    for prefix in ("context", "eval_context", "environment")
+    for suffix in ("function", "filter")
+)
+
+
 def contextfunction(f: F) -> F:
     """Pass the context as the first argument to the decorated function.
 
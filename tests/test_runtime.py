@@ -1,7 +1,9 @@
 import itertools
 
+from jinja2 import Environment
 from jinja2 import Template
 from jinja2.runtime import LoopContext
+from jinja2.runtime import new_context
 
 TEST_IDX_TEMPLATE_STR_1 = (
     "[{% for i in lst|reverse %}(len={{ loop.length }},"
@@ -56,6 +58,34 @@ def test_iterator_not_advanced_early():
     assert out == "1 [(1, 'a'), (1, 'b')]\n2 [(2, 'c')]\n3 [(3, 'd')]\n"
 
 
+def test_context_dict_methods():
+    """keys/values/items walk the parent scope in order first, then the
+    vars-only names in insertion order, with the vars value winning for
+    shadowed keys - the same order and values as the merged dict that
+    ``get_all`` builds.
+    """
+    ctx = new_context(Environment(), "t", {}, globals={"g": 0, "a": 9})
+    ctx.vars.update({"c": 3, "b": 2, "a": 1})
+    assert ctx.keys() == ["g", "a", "c", "b"]
+    assert ctx.items() == [("g", 0), ("a", 1), ("c", 3), ("b", 2)]
+    assert ctx.values() == [0, 1, 3, 2]
+
+
+def test_context_dict_methods_empty_vars():
+    ctx = new_context(Environment(), "t", {}, globals={"g": 0, "a": 9})
+    assert ctx.keys() == ["g", "a"]
+    assert ctx.items() == [("g", 0), ("a", 9)]
+    assert ctx.values() == [0, 9]
+
+
+def test_context_dict_methods_empty_parent():
+    ctx = new_context(Environment(), "t", {})
+    ctx.vars.update({"b": 2, "a": 1})
+    assert ctx.keys() == ["b", "a"]
+    assert ctx.items() == [("b", 2), ("a", 1)]
+    assert ctx.values() == [2, 1]
+
+
 def test_mock_not_pass_arg_marker():
     """If a callable class has a ``__getattr__`` that returns True-like
     values for arbitrary attrs, it should not be incorrectly identified